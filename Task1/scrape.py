@@ -1,9 +1,12 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import lxml.html
+import numpy as np
 import pandas as pd
 import sqlite3
 import time
-from datetime import datetime
+import calendar
 import logging
 from random import choice
 
@@ -17,6 +20,27 @@ USER_AGENTS = [
     "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 ]
 
+# Pre-built request headers, one per User-Agent, so each request only picks one
+USER_AGENT_HEADERS = tuple({"User-Agent": user_agent} for user_agent in USER_AGENTS)
+
+# Yahoo Finance daily history page for a quote between two Unix timestamps
+HISTORY_URL_TEMPLATE = "https://finance.yahoo.com/quote/{quote}/history/?period1={from_date}&period2={to_date}&interval=1d"
+
+# Shared HTTP session so repeated scrapes reuse pooled keep-alive connections
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+SESSION.headers.update({"Accept-Encoding": "gzip, deflate, br", "Accept": "text/html"})
+
+# Connect and read timeouts (seconds) for Yahoo Finance requests
+REQUEST_TIMEOUT = (3.05, 15)
+
+# SQLite in-memory database shared by every store call
+conn = sqlite3.connect(":memory:")
+
 def fetch_historical_exchange_data(quote, from_date, to_date):
     """
     Fetches historical exchange data from Yahoo Finance and returns it as a Pandas DataFrame.
@@ -31,40 +55,46 @@ def fetch_historical_exchange_data(quote, from_date, to_date):
     """
     try:
         # Construct the URL
-        url = f"https://finance.yahoo.com/quote/{quote}/history/?period1={from_date}&period2={to_date}&interval=1d"
-        headers = {"User-Agent": choice(USER_AGENTS)}
-
-        # Fetch the content of the URL
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
+        url = HISTORY_URL_TEMPLATE.format(quote=quote, from_date=from_date, to_date=to_date)
+        headers = choice(USER_AGENT_HEADERS)
 
-        # Parse the HTML content
-        soup = BeautifulSoup(response.content, 'html.parser')
+        # Fetch the URL and stream the decoded body straight into libxml2
+        with SESSION.get(url, headers=headers, timeout=REQUEST_TIMEOUT, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            document = lxml.html.parse(response.raw).getroot()
 
         # Locate the table containing historical data
-        table = soup.find('table')
-        if not table:
+        table = document.find('.//table')
+        if table is None:
             raise ValueError("No historical data table found on the web page.")
 
-        # Extract table headers
-        headers = [header.get_text(strip=True) for header in table.find_all('th')]
+        # Read headers and rows from the table's direct children, walking the body once
+        thead = table.find('thead')
+        headers = [header.text_content().strip() for header in (table if thead is None else thead).iterfind('tr/th')]
+        tbody = table.find('tbody')
+        body = table if tbody is None else tbody
 
-        # Extract table rows
-        rows = []
-        for row in table.find_all('tr'):
-            cells = row.find_all('td')
-            if cells:
-                rows.append([cell.get_text(strip=True) for cell in cells])
+        # Without headers, take the column count from the first data row
+        width = len(headers) or int(body.xpath('count(tr[td][1]/td)'))
+
+        # Skip dividend/split rows that span the table
+        rows = body.xpath(f'tr[count(td)={width}]')
+        cells = np.fromiter(
+            (cell.text_content().strip() for row in rows for cell in row.iterchildren('td')),
+            dtype=object,
+            count=len(rows) * width
+        )
 
         # Create a DataFrame
-        df = pd.DataFrame(rows, columns=headers if headers else None)
+        df = pd.DataFrame(cells.reshape(len(rows), width), columns=headers or None, copy=False)
 
         # Data cleaning: remove rows with missing or malformed data
         df.dropna(inplace=True)
 
         # Convert date column to datetime if it exists
         if 'Date' in df.columns:
-            df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+            df['Date'] = pd.to_datetime(df['Date'], format='%b %d, %Y', errors='coerce')
             df.dropna(subset=['Date'], inplace=True)
 
         return df
@@ -75,6 +105,27 @@ def fetch_historical_exchange_data(quote, from_date, to_date):
         logging.error(f"Error parsing the table: {e}")
 
 
+def dataframe_to_rows(dataframe):
+    """
+    Converts a Pandas DataFrame into a list of row tuples of plain Python values.
+
+    Datetime columns are rendered as text, matching what DataFrame.to_sql stores.
+
+    Parameters:
+        dataframe (pd.DataFrame): The DataFrame to convert.
+
+    Returns:
+        list: One tuple per row, ready for sqlite3 executemany.
+    """
+    columns = []
+    for name in dataframe.columns:
+        column = dataframe[name]
+        if pd.api.types.is_datetime64_any_dtype(column):
+            column = column.dt.strftime("%Y-%m-%d %H:%M:%S")
+        columns.append(column.tolist())
+    return list(zip(*columns))
+
+
 def store_data_in_memory(dataframe, table_name):
     """
     Stores a Pandas DataFrame into an in-memory SQLite database.
@@ -84,15 +135,18 @@ def store_data_in_memory(dataframe, table_name):
         table_name (str): The name of the table to store the data.
     """
     try:
-        # Create an in-memory SQLite database
-        with sqlite3.connect(":memory:") as conn:
-            # Store the DataFrame in the database
-            dataframe.to_sql(table_name, conn, if_exists='replace', index=False)
-            logging.info(f"Data stored in in-memory SQLite database table '{table_name}'.")
-            
-            # For demonstration purposes, query and display the data
-            result = pd.read_sql(f"SELECT * FROM {table_name}", conn)
-            logging.info(f"Queried data from in-memory database:\n{result}")
+        placeholders = ", ".join("?" * len(dataframe.columns))
+
+        # Replace the table and bulk insert the rows in a single transaction
+        with conn:
+            conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+            conn.execute(pd.io.sql.get_schema(dataframe, table_name, con=conn))
+            conn.executemany(f'INSERT INTO "{table_name}" VALUES ({placeholders})', dataframe_to_rows(dataframe))
+        logging.info(f"Data stored in in-memory SQLite database table '{table_name}'.")
+
+        # For demonstration purposes, query and display the data
+        result = pd.read_sql(f"SELECT * FROM {table_name}", conn)
+        logging.info(f"Queried data from in-memory database:\n{result}")
     except Exception as e:
         logging.error(f"Error storing data in in-memory SQLite database: {e}")
 
@@ -104,9 +158,9 @@ if __name__ == "__main__":
     to_date_str = input("Enter the end date (YYYY-MM-DD): ").strip()
 
     try:
-        # Convert dates to Unix timestamps
-        from_date = int(time.mktime(datetime.strptime(from_date_str, "%Y-%m-%d").timetuple()))
-        to_date = int(time.mktime(datetime.strptime(to_date_str, "%Y-%m-%d").timetuple()))
+        # Convert dates to Unix timestamps (midnight UTC)
+        from_date = calendar.timegm(time.strptime(from_date_str, "%Y-%m-%d"))
+        to_date = calendar.timegm(time.strptime(to_date_str, "%Y-%m-%d"))
 
         # Fetch historical exchange data
         historical_data = fetch_historical_exchange_data(quote, from_date, to_date)
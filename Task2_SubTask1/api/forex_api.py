@@ -1,12 +1,21 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import lxml.html
+import numpy as np
 import pandas as pd
 import sqlite3
-from datetime import datetime, timedelta
+import time
+import calendar
+from datetime import datetime
 import logging
+import threading
 from random import choice
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+from flask_caching import Cache
+import orjson
 import re
+from functools import lru_cache
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -18,29 +27,99 @@ USER_AGENTS = [
     "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 ]
 
+# Pre-built request headers, one per User-Agent, so each request only picks one
+USER_AGENT_HEADERS = tuple({"User-Agent": user_agent} for user_agent in USER_AGENTS)
+
+# Yahoo Finance daily history page for a quote between two Unix timestamps
+HISTORY_URL_TEMPLATE = "https://finance.yahoo.com/quote/{quote}/history/?period1={from_date}&period2={to_date}&interval=1d"
+
+# Shared HTTP session so repeated scrapes reuse pooled keep-alive connections
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+SESSION.headers.update({"Accept-Encoding": "gzip, deflate, br", "Accept": "text/html"})
+
+# Connect and read timeouts (seconds) for Yahoo Finance requests
+REQUEST_TIMEOUT = (3.05, 15)
+
 # Flask app initialization
 app = Flask(__name__)
 
+# Per-process response cache for scraped data, keyed by the normalized query;
+# entries expire on their own, so each Gunicorn worker ages out its copy
+cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 3600})
+
+# Seconds a cached response stays fresh, by period unit ('M' months, 'Y' years)
+PERIOD_CACHE_TIMEOUT = {'M': 3600, 'Y': 86400}
+
 # SQLite in-memory database
 conn = sqlite3.connect(":memory:", check_same_thread=False)
 cursor = conn.cursor()
 
+# Serializes writes to the shared connection across worker threads/greenlets
+db_lock = threading.Lock()
+
 # Create a table to store forex data
 cursor.execute("""
 CREATE TABLE IF NOT EXISTS forex_data (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     key TEXT NOT NULL,
     date TEXT,
-    open TEXT,
-    high TEXT,
-    low TEXT,
-    close TEXT,
-    adj_close TEXT,
-    volume TEXT
+    open REAL,
+    high REAL,
+    low REAL,
+    close REAL,
+    adj_close REAL,
+    volume INTEGER
 )
 """)
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_forex_data_key_date ON forex_data (key, date)")
 conn.commit()
 
+# Columns persisted per scraped row, in insert order
+FOREX_COLUMNS = ["date", "open", "high", "low", "close", "adj_close", "volume"]
+
+# Kept as one constant so sqlite3 reuses its cached prepared statement
+INSERT_FOREX_DATA = """
+INSERT INTO forex_data (key, date, open, high, low, close, adj_close, volume)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Rows bound per executemany call when inserting large histories
+INSERT_CHUNK_SIZE = 5000
+
+# Length of one period unit ('M' months, 'Y' years), in seconds
+PERIOD_UNIT_SECONDS = {'M': 30 * 86400, 'Y': 365 * 86400}
+
+SECONDS_PER_DAY = 86400
+
+# How long a memoized scrape is reused before Yahoo Finance is asked again, in seconds
+FETCH_MEMO_SECONDS = 3600
+
+# Patterns used to standardize Yahoo Finance column headers
+CLOSE_PATTERN = re.compile(r"close.*")
+ADJ_CLOSE_PATTERN = re.compile(r"adj close.*")
+VOLUME_PATTERN = re.compile(r"volume.*")
+
+def clean_column_name(col):
+    """
+    Standardizes a Yahoo Finance column header, e.g. 'Adj Close ...' -> 'adj_close'.
+
+    Parameters:
+        col (str): The column header as shown on the page.
+
+    Returns:
+        str: The standardized column name.
+    """
+    col = col.lower().strip()
+    col = CLOSE_PATTERN.sub("close", col)
+    col = ADJ_CLOSE_PATTERN.sub("adj_close", col)
+    col = VOLUME_PATTERN.sub("volume", col)
+    return col
+
 def fetch_historical_exchange_data(quote, from_date, to_date):
     """
     Fetches historical exchange data from Yahoo Finance and returns it as a Pandas DataFrame.
@@ -54,34 +133,42 @@ def fetch_historical_exchange_data(quote, from_date, to_date):
         pd.DataFrame: The historical exchange data as a Pandas DataFrame.
     """
     try:
-        url = f"https://finance.yahoo.com/quote/{quote}/history/?period1={from_date}&period2={to_date}&interval=1d"
-        headers = {"User-Agent": choice(USER_AGENTS)}
+        url = HISTORY_URL_TEMPLATE.format(quote=quote, from_date=from_date, to_date=to_date)
+        headers = choice(USER_AGENT_HEADERS)
 
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
+        # Stream the decoded body straight into libxml2
+        with SESSION.get(url, headers=headers, timeout=REQUEST_TIMEOUT, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            document = lxml.html.parse(response.raw).getroot()
 
-        soup = BeautifulSoup(response.content, 'html.parser')
-        table = soup.find('table')
+        table = document.find('.//table')
 
-        if not table:
+        if table is None:
             raise ValueError("No historical data table found on the web page.")
 
-        # Extract column headers and rows
-        headers = [header.get_text(strip=True) for header in table.find_all('th')]
-        rows = [[cell.get_text(strip=True) for cell in row.find_all('td')] for row in table.find_all('tr') if row.find_all('td')]
+        # Read headers and rows from the table's direct children, walking the body once
+        thead = table.find('thead')
+        headers = [header.text_content().strip() for header in (table if thead is None else thead).iterfind('tr/th')]
+        tbody = table.find('tbody')
+
+        # Columns are selected by name below, so a table without headers cannot be used
+        if not headers:
+            raise ValueError("No column headers found in the historical data table.")
+
+        # Skip dividend/split rows that span the table
+        rows = (table if tbody is None else tbody).xpath(f'tr[count(td)={len(headers)}]')
+        cells = np.fromiter(
+            (cell.text_content().strip() for row in rows for cell in row.iterchildren('td')),
+            dtype=object,
+            count=len(rows) * len(headers)
+        )
 
-        df = pd.DataFrame(rows, columns=headers)
+        df = pd.DataFrame(cells.reshape(len(rows), len(headers)), columns=headers, copy=False)
         df.dropna(inplace=True)
 
         # Standardize column names
-        def clean_column_name(col):
-            col = col.lower().strip()
-            col = re.sub(r"close.*", "close", col)
-            col = re.sub(r"adj close.*", "adj_close", col)
-            col = re.sub(r"volume.*", "volume", col)
-            return col
-
-        df.rename(columns=lambda x: clean_column_name(x), inplace=True)
+        df.columns = [clean_column_name(col) for col in df.columns]
 
         # Keep only valid columns
         required_columns = ["date", "open", "high", "low", "close", "adj_close", "volume"]
@@ -89,12 +176,18 @@ def fetch_historical_exchange_data(quote, from_date, to_date):
 
         # Convert 'date' column to datetime
         if "date" in df.columns:
-            df["date"] = pd.to_datetime(df["date"], errors="coerce")
+            df["date"] = pd.to_datetime(df["date"], format="%b %d, %Y", errors="coerce")
             df.dropna(subset=["date"], inplace=True)
 
-        # Handle missing or invalid values
+        # Convert prices to numbers, dropping thousands separators
+        for col in ["open", "high", "low", "close", "adj_close"]:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col].str.replace(",", "", regex=False), errors="coerce")
+
+        # Handle missing or invalid values, then downcast volume to the smallest integer type
         if "volume" in df.columns:
-            df["volume"] = df["volume"].replace("-", 0).astype(float, errors="ignore")
+            volume = pd.to_numeric(df["volume"].str.replace(",", "", regex=False), errors="coerce").fillna(0)
+            df["volume"] = pd.to_numeric(volume, downcast="integer")
 
         return df
 
@@ -105,6 +198,64 @@ def fetch_historical_exchange_data(quote, from_date, to_date):
         logging.error(f"Error parsing the table: {e}")
         return pd.DataFrame()
 
+@lru_cache(maxsize=64)
+def fetch_day_range(quote, from_day, to_day, memo_bucket):
+    """
+    Memoized scrape of a whole-day window; memo_bucket rolls entries over
+    every FETCH_MEMO_SECONDS.
+
+    Raises:
+        LookupError: If no data was scraped, so that failures are not memoized.
+    """
+    df = fetch_historical_exchange_data(quote, from_day, to_day)
+    if df.empty:
+        raise LookupError(f"No data scraped for {quote}.")
+    return df
+
+def fetch_historical_exchange_data_cached(quote, from_date, to_date):
+    """
+    Fetches historical exchange data, reusing a recent scrape of the same days.
+
+    The window is widened to whole days, so requests that differ only in the
+    time of day share one scrape.
+
+    Parameters:
+        quote (str): The currency pair quote, e.g., 'EURUSD=X'.
+        from_date (int): The start date in Unix timestamp.
+        to_date (int): The end date in Unix timestamp.
+
+    Returns:
+        pd.DataFrame: A copy of the historical exchange data, safe to modify.
+    """
+    from_day = from_date - from_date % SECONDS_PER_DAY
+    to_day = to_date + SECONDS_PER_DAY - 1
+    to_day -= to_day % SECONDS_PER_DAY
+
+    try:
+        return fetch_day_range(quote, from_day, to_day, int(time.time()) // FETCH_MEMO_SECONDS).copy()
+    except LookupError:
+        return pd.DataFrame()
+
+def dataframe_to_rows(dataframe):
+    """
+    Converts a Pandas DataFrame into a list of row tuples of plain Python values.
+
+    Datetime columns are rendered as text, matching what DataFrame.to_sql stores.
+
+    Parameters:
+        dataframe (pd.DataFrame): The DataFrame to convert.
+
+    Returns:
+        list: One tuple per row, ready for sqlite3 executemany.
+    """
+    columns = []
+    for name in dataframe.columns:
+        column = dataframe[name]
+        if pd.api.types.is_datetime64_any_dtype(column):
+            column = column.dt.strftime("%Y-%m-%d %H:%M:%S")
+        columns.append(column.tolist())
+    return list(zip(*columns))
+
 def store_data_in_sqlite(dataframe, key):
     """
     Stores a Pandas DataFrame into the SQLite database.
@@ -115,7 +266,12 @@ def store_data_in_sqlite(dataframe, key):
     """
     try:
         dataframe['key'] = key
-        dataframe.to_sql('forex_data', conn, if_exists='append', index=False)
+        rows = dataframe_to_rows(dataframe.reindex(columns=["key"] + FOREX_COLUMNS))
+
+        # Insert all rows in a single transaction
+        with db_lock, conn:
+            for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+                conn.executemany(INSERT_FOREX_DATA, rows[start:start + INSERT_CHUNK_SIZE])
         logging.info(f"Data stored in SQLite database under key '{key}'.")
     except Exception as e:
         logging.error(f"Error storing data in SQLite: {e}")
@@ -130,15 +286,47 @@ def parse_period_to_timestamps(period):
     Returns:
         tuple: (start_date_unix, end_date_unix)
     """
-    end_date = datetime.now()
-    if period.endswith('M'):
-        start_date = end_date - timedelta(days=30 * int(period[:-1]))
-    elif period.endswith('Y'):
-        start_date = end_date - timedelta(days=365 * int(period[:-1]))
-    else:
+    unit_seconds = PERIOD_UNIT_SECONDS.get(period[-1:])
+    if unit_seconds is None:
         raise ValueError("Invalid period format. Use 'XM' for months or 'XY' for years.")
 
-    return int(start_date.timestamp()), int(end_date.timestamp())
+    end_date = int(time.time())
+    return end_date - unit_seconds * int(period[:-1]), end_date
+
+def dataframe_to_json(dataframe):
+    """
+    Serializes a Pandas DataFrame into a JSON array of records using orjson.
+
+    Datetime columns are written as epoch milliseconds, like DataFrame.to_json.
+
+    Parameters:
+        dataframe (pd.DataFrame): The DataFrame to serialize.
+
+    Returns:
+        bytes: The serialized JSON array.
+    """
+    columns = []
+    for name in dataframe.columns:
+        column = dataframe[name]
+        if pd.api.types.is_datetime64_any_dtype(column):
+            column = (column - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1)
+        columns.append(column.tolist())
+
+    names = list(dataframe.columns)
+    records = [dict(zip(names, row)) for row in zip(*columns)]
+    return orjson.dumps(records)
+
+def json_response(payload):
+    """
+    Wraps an already serialized JSON payload in a Flask response.
+
+    Parameters:
+        payload (bytes): The serialized JSON body.
+
+    Returns:
+        Response: A Flask response with an application/json body.
+    """
+    return Response(payload, mimetype='application/json')
 
 @app.route('/')
 def home():
@@ -154,15 +342,25 @@ def get_forex_data():
         if not all([from_currency, to_currency, period]):
             return jsonify({"error": "Missing required fields: 'from', 'to', 'period'."}), 400
 
+        # Normalize once so the cache, the scrape and the stored key all agree
+        from_currency, to_currency, period = from_currency.upper(), to_currency.upper(), period.upper()
+
+        cache_key = f"forex-data:{from_currency}:{to_currency}:{period}"
+        payload = cache.get(cache_key)
+        if payload is not None:
+            return json_response(payload)
+
         from_date, to_date = parse_period_to_timestamps(period)
         quote = f"{from_currency}{to_currency}=X"
 
-        historical_data = fetch_historical_exchange_data(quote, from_date, to_date)
+        historical_data = fetch_historical_exchange_data_cached(quote, from_date, to_date)
 
         if not historical_data.empty:
             key = f"{from_currency}_{to_currency}_{period}"
             store_data_in_sqlite(historical_data, key)
-            return historical_data.to_json(orient='records')
+            payload = dataframe_to_json(historical_data)
+            cache.set(cache_key, payload, timeout=PERIOD_CACHE_TIMEOUT.get(period[-1]))
+            return json_response(payload)
 
         return jsonify({"error": "No data found for the specified query."}), 404
 
@@ -188,13 +386,21 @@ def get_forex_data_range():
         except ValueError:
             return jsonify({"error": "Invalid date format. Use 'YYYY-MM-DD'."}), 400
 
-        from_date, to_date = int(start_date.timestamp()), int(end_date.timestamp())
-        historical_data = fetch_historical_exchange_data(quote, from_date, to_date)
+        quote = quote.upper()
+        cache_key = f"forex-data-range:{quote}:{start_date_str}:{end_date_str}"
+        payload = cache.get(cache_key)
+        if payload is not None:
+            return json_response(payload)
+
+        from_date, to_date = calendar.timegm(start_date.timetuple()), calendar.timegm(end_date.timetuple())
+        historical_data = fetch_historical_exchange_data_cached(quote, from_date, to_date)
 
         if not historical_data.empty:
             key = f"{quote}_{start_date_str}_to_{end_date_str}"
             store_data_in_sqlite(historical_data, key)
-            return historical_data.to_json(orient='records')
+            payload = dataframe_to_json(historical_data)
+            cache.set(cache_key, payload)
+            return json_response(payload)
 
         return jsonify({"error": "No data found for the specified query."}), 404
 
@@ -203,5 +409,5 @@ def get_forex_data_range():
         return jsonify({"error": "An unexpected error occurred."}), 500
 
 if __name__ == "__main__":
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(host='0.0.0.0', port=5000)
 
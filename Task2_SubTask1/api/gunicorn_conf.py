@@ -0,0 +1,13 @@
+import os
+
+# Gunicorn settings for serving forex_api:app, e.g.:
+#   gunicorn -c gunicorn_conf.py forex_api:app
+bind = "0.0.0.0:5000"
+
+# Cooperative gevent workers, so requests waiting on Yahoo Finance don't block each other
+worker_class = "gevent"
+workers = (os.cpu_count() or 1) * 2 + 1
+worker_connections = 1000
+
+keepalive = 30
+timeout = 60
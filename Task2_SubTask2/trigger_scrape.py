@@ -1,13 +1,19 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import aiohttp
+from aiohttp_client_cache import CachedSession, SQLiteBackend
+from aiohttp_retry import RetryClient, ExponentialRetry
+import lxml.html
+import numpy as np
 import pandas as pd
-import sqlite3
+import pyarrow as pa
+import pyarrow.parquet as pq
+import re
 import time
-from datetime import datetime, timedelta
+from datetime import timedelta
 import logging
 from random import choice
-import schedule
-from concurrent.futures import ThreadPoolExecutor
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.executors.asyncio import AsyncIOExecutor
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -19,11 +25,74 @@ USER_AGENTS = [
     "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 ]
 
-def fetch_historical_exchange_data(quote, from_date, to_date):
+# Pre-built request headers, one per User-Agent, so each request only picks one
+USER_AGENT_HEADERS = tuple({"User-Agent": user_agent} for user_agent in USER_AGENTS)
+
+# Yahoo Finance daily history page for a quote between two Unix timestamps
+HISTORY_URL_TEMPLATE = "https://finance.yahoo.com/quote/{quote}/history/?period1={from_date}&period2={to_date}&interval=1d"
+
+# Name of the SQLite response cache, so unchanged history is not re-downloaded every run
+CACHE_NAME = 'yahoo_cache'
+
+# Connect and read timeouts (seconds) for Yahoo Finance requests
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(sock_connect=3.05, sock_read=15)
+
+# Retry transient Yahoo Finance failures with exponential backoff
+RETRY_OPTIONS = ExponentialRetry(attempts=3, start_timeout=0.3, statuses={429, 500, 502, 503, 504})
+
+# How long a scraped page stays fresh in the response cache
+CACHE_TTL = timedelta(minutes=15)
+
+# Length of each supported scraping period, in seconds
+PERIOD_SECONDS = {
+    '1W': 7 * 86400,
+    '1M': 30 * 86400,
+    '3M': 90 * 86400,
+    '6M': 180 * 86400,
+    '1Y': 365 * 86400
+}
+
+# Parquet dataset holding the latest snapshot per currency pair and period
+PARQUET_ROOT = 'forex.parquet'
+
+# Column types written to Parquet
+PARQUET_DTYPES = {
+    'open': 'float64',
+    'high': 'float64',
+    'low': 'float64',
+    'close': 'float64',
+    'adj_close': 'float64',
+    'volume': 'int64'
+}
+
+# Patterns used to standardize Yahoo Finance column headers
+CLOSE_PATTERN = re.compile(r"close.*")
+ADJ_CLOSE_PATTERN = re.compile(r"adj close.*")
+VOLUME_PATTERN = re.compile(r"volume.*")
+
+def clean_column_name(col):
+    """
+    Standardizes a Yahoo Finance column header, e.g. 'Adj Close ...' -> 'adj_close'.
+
+    Parameters:
+        col (str): The column header as shown on the page.
+
+    Returns:
+        str: The standardized column name.
+    """
+    col = col.lower().strip()
+    col = CLOSE_PATTERN.sub("close", col)
+    col = ADJ_CLOSE_PATTERN.sub("adj_close", col)
+    col = VOLUME_PATTERN.sub("volume", col)
+    return col
+
+
+async def fetch_historical_exchange_data(client, quote, from_date, to_date):
     """
     Fetches historical exchange data from Yahoo Finance and returns it as a Pandas DataFrame.
 
     Parameters:
+        client (RetryClient): The HTTP client shared by the current scraping run.
         quote (str): The currency pair quote, e.g., 'GBPINR=X'.
         from_date (int): The start date in Unix timestamp.
         to_date (int): The end date in Unix timestamp.
@@ -33,138 +102,208 @@ def fetch_historical_exchange_data(quote, from_date, to_date):
     """
     try:
         # Construct the URL
-        url = f"https://finance.yahoo.com/quote/{quote}/history/?period1={from_date}&period2={to_date}&interval=1d"
-        headers = {"User-Agent": choice(USER_AGENTS)}
+        url = HISTORY_URL_TEMPLATE.format(quote=quote, from_date=from_date, to_date=to_date)
+        headers = choice(USER_AGENT_HEADERS)
 
         # Fetch the content of the URL
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
+        async with client.get(url, headers=headers) as response:
+            response.raise_for_status()
+            content = await response.read()
 
-        # Parse the HTML content
-        soup = BeautifulSoup(response.content, 'html.parser')
+        # Parse off the event loop; lxml releases the GIL while parsing
+        return await asyncio.get_running_loop().run_in_executor(None, parse_historical_exchange_data, content)
 
-        # Locate the table containing historical data
-        table = soup.find('table')
-        if not table:
-            raise ValueError("No historical data table found on the web page.")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logging.error(f"Error fetching the URL: {e}")
+    except Exception as e:
+        logging.error(f"Error parsing the table: {e}")
 
-        # Extract table headers
-        headers = [header.get_text(strip=True) for header in table.find_all('th')]
 
-        # Extract table rows
-        rows = []
-        for row in table.find_all('tr'):
-            cells = row.find_all('td')
-            if cells:
-                rows.append([cell.get_text(strip=True) for cell in cells])
+def parse_historical_exchange_data(content):
+    """
+    Parses a Yahoo Finance history page into a Pandas DataFrame.
 
-        # Create a DataFrame
-        df = pd.DataFrame(rows, columns=headers if headers else None)
+    Parameters:
+        content (bytes): The raw HTML of the page.
 
-        # Data cleaning: remove rows with missing or malformed data
-        df.dropna(inplace=True)
+    Returns:
+        pd.DataFrame: The historical exchange data as a Pandas DataFrame.
+    """
+    # Parse the HTML content with libxml2
+    document = lxml.html.fromstring(content)
 
-        # Convert date column to datetime if it exists
-        if 'Date' in df.columns:
-            df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-            df.dropna(subset=['Date'], inplace=True)
+    # Locate the table containing historical data
+    table = document.find('.//table')
+    if table is None:
+        raise ValueError("No historical data table found on the web page.")
 
-        return df
+    # Read headers and rows from the table's direct children, walking the body once
+    thead = table.find('thead')
+    headers = [header.text_content().strip() for header in (table if thead is None else thead).iterfind('tr/th')]
+    tbody = table.find('tbody')
 
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error fetching the URL: {e}")
-    except Exception as e:
-        logging.error(f"Error parsing the table: {e}")
+    # Columns are selected by name below, so a table without headers cannot be used
+    if not headers:
+        raise ValueError("No column headers found in the historical data table.")
+
+    # Skip dividend/split rows that span the table
+    rows = (table if tbody is None else tbody).xpath(f'tr[count(td)={len(headers)}]')
+    cells = np.fromiter(
+        (cell.text_content().strip() for row in rows for cell in row.iterchildren('td')),
+        dtype=object,
+        count=len(rows) * len(headers)
+    )
+
+    # Create a DataFrame
+    df = pd.DataFrame(cells.reshape(len(rows), len(headers)), columns=headers, copy=False)
+
+    # Data cleaning: remove rows with missing or malformed data
+    df.dropna(inplace=True)
+
+    # Standardize column names and keep only the stored columns
+    df.columns = [clean_column_name(col) for col in df.columns]
+    df = df[['date'] + list(PARQUET_DTYPES)].copy()
+
+    # Convert date column to datetime
+    df['date'] = pd.to_datetime(df['date'], format='%b %d, %Y', errors='coerce')
+    df = df.dropna(subset=['date'])
+
+    # Convert prices and volume to numbers, dropping thousands separators
+    for col in PARQUET_DTYPES:
+        df[col] = pd.to_numeric(df[col].str.replace(',', '', regex=False), errors='coerce')
+    df['volume'] = df['volume'].fillna(0)
 
+    return df
 
-def store_data_in_memory_db(dataframe, table_name="exchange_rates"):
+
+def store_data_in_parquet(dataframe, pair, period):
     """
-    Stores a Pandas DataFrame into an in-memory SQLite database.
+    Stores a Pandas DataFrame in the Parquet dataset, replacing the previous
+    snapshot held in the pair/period partition.
 
     Parameters:
         dataframe (pd.DataFrame): The DataFrame to store.
-        table_name (str): The name of the table to store the data.
+        pair (str): Currency pair (e.g., 'GBPINR=X').
+        period (str): Time period (e.g., '1W', '1M').
     """
     try:
-        with sqlite3.connect(":memory:") as conn:
-            dataframe.to_sql(table_name, conn, if_exists='append', index=False)
-            logging.info(f"Data stored in in-memory table '{table_name}'.")
+        typed = dataframe.astype(PARQUET_DTYPES).assign(pair=pair, period=period)
+        table = pa.Table.from_pandas(typed, preserve_index=False)
+        pq.write_to_dataset(
+            table,
+            root_path=PARQUET_ROOT,
+            partition_cols=['pair', 'period'],
+            compression='zstd',
+            use_dictionary=True,
+            existing_data_behavior='delete_matching'
+        )
+        logging.info(f"Data stored in Parquet partition '{pair}/{period}'.")
     except Exception as e:
-        logging.error(f"Error storing data in in-memory SQLite: {e}")
+        logging.error(f"Error storing data in Parquet: {e}")
 
 
 def get_period_timestamps(period):
     """
     Get Unix timestamps for the given period.
     Example: '1W' -> 1 week ago, '1M' -> 1 month ago, etc.
+
+    The end of the window is rounded down to the cache TTL, so every run
+    within that TTL requests the same URL and is served from the cache.
     """
-    end_date = datetime.now()
-    if period == '1W':
-        start_date = end_date - timedelta(weeks=1)
-    elif period == '1M':
-        start_date = end_date - timedelta(days=30)
-    elif period == '3M':
-        start_date = end_date - timedelta(days=90)
-    elif period == '6M':
-        start_date = end_date - timedelta(days=180)
-    elif period == '1Y':
-        start_date = end_date - timedelta(days=365)
-    else:
+    if period not in PERIOD_SECONDS:
         raise ValueError(f"Invalid period: {period}")
 
-    # Convert to Unix timestamps
-    from_timestamp = int(time.mktime(start_date.timetuple()))
-    to_timestamp = int(time.mktime(end_date.timetuple()))
+    ttl_seconds = int(CACHE_TTL.total_seconds())
+    now = int(time.time())
+    to_timestamp = now - now % ttl_seconds
 
-    return from_timestamp, to_timestamp
+    return to_timestamp - PERIOD_SECONDS[period], to_timestamp
 
 
-def scrape_and_store(pair, period):
+async def scrape_and_store(client, pair, periods):
     """
-    Scrapes and stores data for a given currency pair and period.
+    Scrapes the longest of the given periods for a currency pair once and
+    stores a slice of it for every period.
 
     Parameters:
+        client (RetryClient): The HTTP client shared by the current scraping run.
         pair (str): Currency pair (e.g., 'GBPINR=X').
-        period (str): Time period (e.g., '1W', '1M').
+        periods (list): Time periods to store (e.g., ['1W', '1M']).
     """
-    logging.info(f"Scraping data for {pair} for the period {period}")
+    logging.info(f"Scraping data for {pair} for the periods {', '.join(periods)}")
     try:
-        from_date, to_date = get_period_timestamps(period)
-        historical_data = fetch_historical_exchange_data(pair, from_date, to_date)
-
-        if historical_data is not None and not historical_data.empty:
-            table_name = f"exchange_rates_{pair}_{period}".replace('=', '').replace('X', '')
-            store_data_in_memory_db(historical_data, table_name=table_name)
-            logging.info(f"Data for {pair} for {period} successfully stored in memory.")
-        else:
-            logging.warning(f"No data found for {pair} for {period}.")
+        longest_period = max(periods, key=PERIOD_SECONDS.get)
+        from_date, to_date = get_period_timestamps(longest_period)
+        historical_data = await fetch_historical_exchange_data(client, pair, from_date, to_date)
+
+        if historical_data is None or historical_data.empty:
+            logging.warning(f"No data found for {pair}.")
+            return
+
+        for period in periods:
+            # Window edges are UTC epochs; the scraped dates are naive UTC calendar days
+            cutoff = pd.Timestamp(get_period_timestamps(period)[0], unit='s')
+            period_data = historical_data[historical_data['date'] >= cutoff]
+
+            # An empty write leaves the partition untouched, so the old snapshot would stay
+            if period_data.empty:
+                logging.warning(f"No data found for {pair} for {period}; keeping the previous snapshot.")
+                continue
+
+            store_data_in_parquet(period_data, pair, period)
+            logging.info(f"Data for {pair} for {period} successfully stored.")
     except Exception as e:
-        logging.error(f"Error scraping data for {pair} for {period}: {e}")
+        logging.error(f"Error scraping data for {pair}: {e}")
 
 
-def schedule_scraping():
+async def scrape_all(currency_pairs, periods):
+    """
+    Scrapes every currency pair concurrently over one connection pool.
+
+    Parameters:
+        currency_pairs (list): Currency pairs to scrape (e.g., ['GBPINR=X']).
+        periods (list): Time periods to store for each pair (e.g., ['1W', '1M']).
+    """
+    cache = SQLiteBackend(CACHE_NAME, expire_after=CACHE_TTL, allowed_methods=('GET',))
+    connector = aiohttp.TCPConnector(limit=20, ttl_dns_cache=300)
+    headers = {"Accept-Encoding": "gzip, deflate, br", "Accept": "text/html"}
+
+    async with CachedSession(cache=cache, connector=connector, headers=headers, timeout=REQUEST_TIMEOUT) as session:
+        client = RetryClient(client_session=session, retry_options=RETRY_OPTIONS)
+        await asyncio.gather(*(scrape_and_store(client, pair, periods) for pair in currency_pairs))
+
+
+async def schedule_scraping():
     """
     Schedules the scraping task for multiple currency pairs and periods.
     """
     currency_pairs = ["GBPINR=X", "AEDINR=X"]
     periods = ['1W', '1M', '3M', '6M', '1Y']
 
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        for pair in currency_pairs:
-            for period in periods:
-                executor.submit(scrape_and_store, pair, period)
+    await scrape_all(currency_pairs, periods)
+
+
+async def run_scheduler():
+    """
+    Runs the scraping jobs on the event loop's timer until the process is stopped.
+    """
+    scheduler = AsyncIOScheduler(executors={'default': AsyncIOExecutor()})
+
+    # Schedule tasks; a run that is still in progress is never started twice
+    scheduler.add_job(schedule_scraping, 'interval', minutes=5, coalesce=True, max_instances=1)
+    scheduler.add_job(schedule_scraping, 'cron', hour=0, minute=0, coalesce=True, max_instances=1)
+    scheduler.start()
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        scheduler.shutdown(wait=False)
 
 
 if __name__ == "__main__":
     logging.info("Starting the scheduled scraping job.")
 
-    # Schedule tasks
-    schedule.every(5).minutes.do(schedule_scraping)
-    schedule.every().day.at("00:00").do(schedule_scraping)
-
     try:
-        while True:
-            schedule.run_pending()
-            time.sleep(1)
+        asyncio.run(run_scheduler())
     except KeyboardInterrupt:
         logging.info("Exiting the application.")